@@ -7,19 +7,75 @@ This tool downloads articles from esa.io based on search queries and saves them
 """
 
 import argparse
+import hashlib
 import json
 import os
 import re
+import shutil
 import sys
+import tempfile
+import threading
 import time
 import urllib.parse
-import urllib.request
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple
 from PIL import Image
 import io
+import urllib3
+
+try:
+    import pyvips
+except (ImportError, OSError):
+    # pyvips is optional; it raises OSError when libvips itself is missing
+    pyvips = None
+
+
+# Pattern to match img tags; group 1 is the src URL
+_IMG_RE = re.compile(r'<img\b[^>]*\ssrc="([^"]+)"[^>]*>', re.IGNORECASE)
+# Pattern to match the width attribute inside a single img tag
+_WIDTH_RE = re.compile(r'\swidth="([^"]+)"', re.IGNORECASE)
+# Pattern to match saved post filenames; group 1 is the post number
+_POST_FILENAME_RE = re.compile(r'^(\d+)_.*\.md$')
+# Keep-alive connections per host; requests beyond this wait for a free one,
+# which also caps concurrent requests to esa.io
+_MAX_CONNECTIONS_PER_HOST = 4
+# Height bound passed to pyvips thumbnail() so only the width constrains it
+_VIPS_MAX_HEIGHT = 10_000_000
+# Characters that are invalid in file systems and their replacements
+_SANITIZE_TABLE = str.maketrans({
+    '/': '_',
+    '\\': '_',
+    ':': '-',
+    '*': '_',
+    '?': '_',
+    '"': "'",
+    '<': '(',
+    '>': ')',
+    '|': '_',
+    '\n': ' ',
+    '\r': ' ',
+    '\t': ' '
+})
+# Serializes output from worker threads so their lines do not interleave
+_print_lock = threading.Lock()
+
+
+def _log(message: str) -> None:
+    """Print a line of output; safe to call from worker threads"""
+    with _print_lock:
+        print(message)
+
+
+class _Retry(urllib3.Retry):
+    """Retry policy that leaves rate limiting (429) to EsaClient._request"""
+    
+    # urllib3 would otherwise also retry 429 whenever Retry-After is sent,
+    # multiplying the attempts and waits counted in _request
+    RETRY_AFTER_STATUS_CODES = frozenset({413, 503})
 
 
 class EsaClient:
@@ -40,6 +96,23 @@ class EsaClient:
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
+        # Shared connection pool so keep-alive connections are reused across
+        # API calls and image downloads. Each host gets a fixed set of
+        # connections (block=True) so none are opened and thrown away under
+        # load, and num_pools leaves room for image hosts without evicting
+        # the api.esa.io pool.
+        self.http = urllib3.PoolManager(
+            num_pools=16,
+            maxsize=_MAX_CONNECTIONS_PER_HOST,
+            block=True,
+            retries=_Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=[500, 502, 503, 504],
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+        )
         
     def _request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -54,66 +127,49 @@ class EsaClient:
             
         Raises:
             urllib.error.HTTPError: For HTTP errors
-            urllib.error.URLError: For network errors
+            urllib3.exceptions.HTTPError: For network errors
         """
         url = f"{self.base_url}{endpoint}"
         
         if params:
             # Convert params to query string with proper encoding
-            query_params = []
-            for key, value in params.items():
-                if value is not None:
-                    # Handle special encoding for search query
-                    if key == 'q':
-                        encoded_value = urllib.parse.quote(str(value), safe='')
-                    else:
-                        encoded_value = urllib.parse.quote(str(value))
-                    query_params.append(f"{key}={encoded_value}")
+            # (quote with safe='' so '/' in the search query is encoded too)
+            query_params = {k: v for k, v in params.items() if v is not None}
             if query_params:
-                url += "?" + "&".join(query_params)
+                url += "?" + urllib.parse.urlencode(query_params, quote_via=urllib.parse.quote)
         
+        # Network errors and 5xx responses are retried with exponential
+        # backoff by the pool's Retry policy; rate limiting (429) is not
+        # covered by it and is retried here up to max_retries times
         max_retries = 3
-        retry_delay = 1
         
         for attempt in range(max_retries):
+            response = self.http.request(
+                "GET", url, headers=self.headers, preload_content=False
+            )
             try:
-                request = urllib.request.Request(url, headers=self.headers)
-                with urllib.request.urlopen(request) as response:
-                    return json.loads(response.read().decode('utf-8'))
-                    
-            except urllib.error.HTTPError as e:
-                if e.code == 429:  # Rate limit
-                    # Get retry after header
-                    retry_after = e.headers.get('Retry-After', '60')
-                    wait_time = int(retry_after)
-                    print(f"Rate limit exceeded. Waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
-                elif e.code == 401:
-                    print("Authentication error: Invalid access token")
-                    sys.exit(1)
-                elif e.code == 404:
-                    raise e
-                elif e.code >= 500:
-                    if attempt < max_retries - 1:
-                        print(f"Server error ({e.code}). Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                        continue
-                    else:
-                        raise e
-                else:
-                    raise e
-                    
-            except urllib.error.URLError as e:
-                if attempt < max_retries - 1:
-                    print(f"Network error: {e.reason}. Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                else:
-                    raise e
+                if response.status < 400:
+                    # Parse straight from the response stream
+                    return json.load(response)
+                response.drain_conn()
+            finally:
+                response.release_conn()
                     
+            if response.status == 429:  # Rate limit
+                # Get retry after header
+                retry_after = response.headers.get('Retry-After', '60')
+                wait_time = int(retry_after)
+                _log(f"Rate limit exceeded. Waiting {wait_time} seconds...")
+                time.sleep(wait_time)
+                continue
+            elif response.status == 401:
+                _log("Authentication error: Invalid access token")
+                sys.exit(1)
+            else:
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+                
         raise Exception(f"Failed to fetch {url} after {max_retries} attempts")
         
     def search_posts(self, query: Optional[str] = None, page: int = 1, 
@@ -153,18 +209,155 @@ class EsaClient:
         return self._request(endpoint)
 
 
+class DownloadState:
+    """Persists what was downloaded so that re-runs can skip unchanged content"""
+    
+    FILENAME = ".esaloader_state.json"
+    
+    def __init__(self, output_dir: Path):
+        """
+        Initialize the state and load it from the output directory
+        
+        Args:
+            output_dir: Output directory path
+        """
+        self.output_dir = output_dir
+        self.path = output_dir / self.FILENAME
+        # post number -> {"updated_at", "path", "complete"}
+        self.posts: Dict[str, Dict[str, Any]] = {}
+        # image URL -> directory -> resize width ("" if none)
+        #   -> {"filename", "etag", "last_modified"}
+        self.images: Dict[str, Dict[str, Dict[str, Dict[str, Optional[str]]]]] = {}
+        self._lock = threading.Lock()
+        self.load()
+        
+    def _relative(self, path: Path) -> str:
+        """Return path relative to the output directory in POSIX form"""
+        return Path(path).relative_to(self.output_dir).as_posix()
+        
+    def load(self) -> None:
+        """Load state from disk, starting empty if it is missing or invalid"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable state file {self.path}: {e}")
+            return
+            
+        self.posts = data.get('posts', {})
+        self.images = data.get('images', {})
+        
+    def save(self) -> None:
+        """Write state to disk atomically"""
+        with self._lock:
+            data = {'posts': self.posts, 'images': self.images}
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            
+    def get_post(self, post_number: int) -> Optional[Dict[str, Any]]:
+        """
+        Look up a previously saved post
+        
+        Args:
+            post_number: Post number
+            
+        Returns:
+            Entry with updated_at, path and complete, or None
+        """
+        return self.posts.get(str(post_number))
+        
+    def set_post(self, post: Dict[str, Any], filepath: str, complete: bool = True) -> None:
+        """
+        Record a saved post
+        
+        Args:
+            post: Post data that was saved
+            filepath: Path of the saved file
+            complete: False if some images could not be downloaded, so the
+                post is downloaded again on the next run
+        """
+        with self._lock:
+            self.posts[str(post['number'])] = {
+                'updated_at': post.get('updated_at', ''),
+                'path': self._relative(filepath),
+                'complete': complete
+            }
+            
+    def get_image(self, url: str, target_dir: Path,
+                  width: Optional[int]) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Look up a previously downloaded image
+        
+        Args:
+            url: Image URL
+            target_dir: Directory the image was saved in
+            width: Width the image was resized to, or None
+            
+        Returns:
+            Entry with filename, etag and last_modified, or None
+        """
+        with self._lock:
+            widths = self.images.get(url, {}).get(self._relative(target_dir), {})
+            return widths.get(str(width or ''))
+            
+    def set_image(self, url: str, target_dir: Path, width: Optional[int], filename: str,
+                  etag: Optional[str], last_modified: Optional[str]) -> None:
+        """
+        Record a downloaded image and its cache validators
+        
+        Args:
+            url: Image URL
+            target_dir: Directory the image was saved in
+            width: Width the image was resized to, or None
+            filename: Local filename
+            etag: ETag response header
+            last_modified: Last-Modified response header
+        """
+        with self._lock:
+            widths = self.images.setdefault(url, {}).setdefault(self._relative(target_dir), {})
+            widths[str(width or '')] = {
+                'filename': filename,
+                'etag': etag,
+                'last_modified': last_modified
+            }
+
+
 class ImageDownloader:
     """Handles downloading and processing images from esa.io articles"""
     
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False,
+                 http: Optional[urllib3.PoolManager] = None,
+                 state: Optional[DownloadState] = None):
         """
         Initialize the image downloader
         
         Args:
             verbose: Enable verbose logging
+            http: Connection pool to share with the API client (optional)
+            state: Download state used for conditional requests (optional)
         """
         self.verbose = verbose
+        self.state = state
+        if http is None:
+            http = urllib3.PoolManager(maxsize=_MAX_CONNECTIONS_PER_HOST, block=True)
+        self.http = http
         self.downloaded_images = {}  # Cache to avoid duplicate downloads
+        # One lock per URL and directory so a URL is only fetched once at a time
+        self._download_locks: Dict[Tuple[str, Path], threading.Lock] = {}
+        # Unresized download per URL and directory that further widths are
+        # resized from; removed by cleanup()
+        self._originals: Dict[Tuple[str, Path], Dict[str, Any]] = {}
+        self._download_locks_lock = threading.Lock()
+        # Filenames already taken per directory, guarded for worker threads
+        self._used_names: Dict[Path, Set[str]] = {}
+        self._filename_lock = threading.Lock()
+        # Image directories known to exist, to skip repeated mkdir calls
+        self._created_dirs: Set[Path] = set()
+        self._dirs_lock = threading.Lock()
         
     def extract_images(self, markdown_text: str) -> List[Dict[str, str]]:
         """
@@ -176,82 +369,338 @@ class ImageDownloader:
         Returns:
             List of image information dictionaries
         """
-        # Pattern to match img tags with src and optional width
-        pattern = r'<img[^>]*\s+src="([^"]+)"[^>]*(?:\s+width="([^"]+)")?[^>]*>'
-        matches = re.findall(pattern, markdown_text, re.IGNORECASE)
-        
+        # No '<img' substring pre-check: _IMG_RE starts with a literal '<' the
+        # regex engine scans for quickly, and a case-insensitive check costs more
         images = []
-        for match in matches:
-            src_url = match[0]
-            width = match[1] if match[1] else None
+        for match in _IMG_RE.finditer(markdown_text):
+            original_tag = match.group(0)
+            width_match = _WIDTH_RE.search(original_tag)
             images.append({
-                'src': src_url,
-                'width': width,
-                'original_tag': re.search(
-                    r'<img[^>]*\s+src="' + re.escape(src_url) + r'"[^>]*>',
-                    markdown_text,
-                    re.IGNORECASE
-                ).group(0) if re.search(
-                    r'<img[^>]*\s+src="' + re.escape(src_url) + r'"[^>]*>',
-                    markdown_text,
-                    re.IGNORECASE
-                ) else ''
+                'src': match.group(1),
+                'width': width_match.group(1) if width_match else None,
+                'original_tag': original_tag
             })
             
         return images
         
-    def download_image(self, url: str, target_dir: Path) -> Optional[str]:
+    def _reserve_filename(self, target_dir: Path, original_filename: str) -> str:
         """
-        Download image from URL to target directory
+        Pick an unused filename in target_dir and create the file exclusively
         
         Args:
-            url: Image URL
             target_dir: Target directory path
+            original_filename: Preferred filename
             
         Returns:
-            Local filename if successful, None if failed
+            Chosen filename; an empty file with that name now exists
         """
-        try:
-            # Extract filename from URL
-            parsed_url = urllib.parse.urlparse(url)
-            original_filename = os.path.basename(parsed_url.path)
-            
-            # If no filename in path, generate one
-            if not original_filename or '.' not in original_filename:
-                original_filename = f"image_{hash(url) % 10000}.png"
+        name, ext = os.path.splitext(original_filename)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+        
+        with self._filename_lock:
+            # List the directory once instead of stat()ing every candidate
+            used = self._used_names.get(target_dir)
+            if used is None:
+                used = self._used_names[target_dir] = set(os.listdir(target_dir))
                 
-            # Ensure unique filename
             filename = original_filename
             counter = 1
-            while (target_dir / filename).exists():
-                name, ext = os.path.splitext(original_filename)
+            while True:
+                if filename not in used:
+                    used.add(filename)
+                    try:
+                        os.close(os.open(target_dir / filename, flags, 0o644))
+                        return filename
+                    except FileExistsError:
+                        # Created outside of this process since the listing
+                        pass
                 filename = f"{name}_{counter}{ext}"
                 counter += 1
                 
-            target_path = target_dir / filename
+    def _release_filename(self, target_dir: Path, filename: str) -> None:
+        """
+        Remove a reserved file and make its name available again
+        
+        Args:
+            target_dir: Target directory path
+            filename: Filename returned by _reserve_filename()
+        """
+        with self._filename_lock:
+            (target_dir / filename).unlink(missing_ok=True)
+            self._used_names.get(target_dir, set()).discard(filename)
+            
+    @staticmethod
+    def _resize_width(width: Optional[str]) -> Optional[int]:
+        """
+        Convert an img width attribute to the width to resize to
+        
+        Args:
+            width: Value of the width attribute
             
-            # Download image
-            request = urllib.request.Request(url)
-            with urllib.request.urlopen(request) as response:
-                image_data = response.read()
+        Returns:
+            Width in pixels, or None if the image should not be resized
+        """
+        return int(width) if width and width.isdigit() else None
+        
+    def download_image(self, url: str, target_dir: Path,
+                       width: Optional[int] = None) -> Optional[str]:
+        """
+        Download image from URL to target directory, reusing earlier downloads
+        
+        Args:
+            url: Image URL
+            target_dir: Target directory path
+            width: Width to resize the downloaded image to (optional)
+            
+        Returns:
+            Local filename if successful, None if failed
+        """
+        # Cache per directory so the same URL in another category still
+        # gets a local copy next to its article, and per width so every
+        # size gets its own file resized from the original
+        key = (url, target_dir, width)
+        # Lock per URL and directory since all widths share one download
+        with self._download_locks_lock:
+            lock = self._download_locks.setdefault((url, target_dir), threading.Lock())
+            
+        with lock:
+            if key in self.downloaded_images:
+                return self.downloaded_images[key]
                 
-            # Save original image temporarily
-            with open(target_path, 'wb') as f:
-                f.write(image_data)
+            filename = self._fetch_image(url, target_dir, width)
+            if filename:
+                self.downloaded_images[key] = filename
+            return filename
+            
+    @staticmethod
+    def _is_current(known: Optional[Dict[str, Optional[str]]],
+                    original: Dict[str, Any]) -> bool:
+        """
+        Check whether a local copy was made from the given download
+        
+        Args:
+            known: Download state entry of the local copy, or None
+            original: Download returned by _download_original()
+            
+        Returns:
+            True if both have the same cache validators
+        """
+        return bool(known and (known['etag'] or known['last_modified'])
+                    and known['etag'] == original['etag']
+                    and known['last_modified'] == original['last_modified'])
+                    
+    def _download_original(self, url: str, target_dir: Path, ext: str,
+                           known: Optional[Dict[str, Optional[str]]]) -> Dict[str, Any]:
+        """
+        Download an image as served into a temporary file in target_dir
+        
+        Args:
+            url: Image URL
+            target_dir: Target directory path
+            ext: Extension for the temporary file, so resizers detect the format
+            known: Download state entry of a local copy to validate, or None
+            
+        Returns:
+            Dictionary with the temporary file's path (None if the server
+            answered 304 for the local copy), etag and last_modified
+        """
+        headers = {}
+        if known:
+            # Let the server skip the body if our copy is current
+            if known['etag']:
+                headers['If-None-Match'] = known['etag']
+            if known['last_modified']:
+                headers['If-Modified-Since'] = known['last_modified']
+                
+        response = self.http.request("GET", url, headers=headers, preload_content=False)
+        try:
+            if response.status == 304:
+                response.drain_conn()
+                return {'path': None, 'etag': known['etag'],
+                        'last_modified': known['last_modified']}
+                        
+            if response.status >= 400:
+                response.drain_conn()
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+                
+            # Stream the body straight to disk
+            fd, tmp_name = tempfile.mkstemp(prefix='.esaloader-', suffix=ext, dir=target_dir)
+            try:
+                with open(fd, 'wb') as f:
+                    shutil.copyfileobj(response, f, length=64 * 1024)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+        finally:
+            response.release_conn()
+            
+        if self.verbose:
+            _log(f"Downloaded image: {url}")
+            
+        return {'path': Path(tmp_name), 'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')}
                 
+    def _fetch_image(self, url: str, target_dir: Path,
+                     width: Optional[int] = None) -> Optional[str]:
+        """
+        Fetch image from URL into target directory and resize it
+        
+        The image is downloaded once per directory and kept until cleanup(),
+        and each width is resized from a copy of that download. If the
+        download state has a local copy of the image at this width, the
+        request is made conditional and the copy is kept when the server
+        answers 304. A new file only replaces the local copy once it is
+        complete, so a failure leaves the previous copy and its state entry
+        intact.
+        
+        Must be called with the lock for url and target_dir held.
+        
+        Args:
+            url: Image URL
+            target_dir: Target directory path
+            width: Width to resize the downloaded image to (optional)
+            
+        Returns:
+            Local filename if successful, None if failed
+        """
+        known = self.state.get_image(url, target_dir, width) if self.state else None
+        if known and not (target_dir / known['filename']).exists():
+            known = None
+            
+        # Extract filename from URL
+        parsed_url = urllib.parse.urlparse(url)
+        original_filename = os.path.basename(parsed_url.path)
+        
+        # If no filename in path, generate a stable one from the URL
+        if not original_filename or '.' not in original_filename:
+            digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).hexdigest()
+            original_filename = f"image_{digest}.png"
+        ext = os.path.splitext(original_filename)[1]
+        
+        filename = None
+        tmp_path = None
+        reserved = False
+        try:
+            # Only go to the network again if this run has no download yet,
+            # or only validated another width's copy and it is not this one's
+            original = self._originals.get((url, target_dir))
+            if original is None or (original['path'] is None
+                                    and not self._is_current(known, original)):
+                original = self._download_original(url, target_dir, ext, known)
+                self._originals[(url, target_dir)] = original
+                
+            if self._is_current(known, original):
+                if self.verbose:
+                    _log(f"Image not modified: {known['filename']}")
+                return known['filename']
+                
+            # Resize a copy in the same directory, keeping the extension so
+            # the resizer can pick the format
+            fd, tmp_name = tempfile.mkstemp(prefix='.esaloader-', suffix=ext, dir=target_dir)
+            os.close(fd)
+            tmp_path = Path(tmp_name)
+            shutil.copyfile(original['path'], tmp_path)
+            if width:
+                self.resize_image(tmp_path, width)
+                
+            if known:
+                # Replace the outdated local copy under the same name
+                filename = known['filename']
+            else:
+                # Ensure unique filename, reserving it so that concurrent
+                # downloads cannot pick the same name
+                filename = self._reserve_filename(target_dir, original_filename)
+                reserved = True
+                
+            # Swap the complete file in
+            os.replace(tmp_path, target_dir / filename)
+            tmp_path = None
+            reserved = False
+            
             if self.verbose:
-                print(f"Downloaded image: {filename}")
+                _log(f"Saved image: {filename}")
+                
+            if self.state:
+                self.state.set_image(url, target_dir, width, filename,
+                                     original['etag'], original['last_modified'])
                 
             return filename
             
         except Exception as e:
-            print(f"Failed to download image {url}: {e}")
+            _log(f"Failed to download image {url}: {e}")
+            # Remove the partial file and any name reserved for it; an
+            # earlier local copy is left untouched
+            if tmp_path is not None:
+                tmp_path.unlink(missing_ok=True)
+            if reserved:
+                self._release_filename(target_dir, filename)
             return None
             
+    def cleanup(self) -> None:
+        """Remove the downloads kept for resizing images to further widths"""
+        for original in self._originals.values():
+            if original['path'] is not None:
+                original['path'].unlink(missing_ok=True)
+        self._originals.clear()
+        
+    def _resize_with_vips(self, image_path: Path, target_width: int) -> bool:
+        """
+        Resize image to target width with libvips
+        
+        thumbnail() shrinks while decoding and streams the image, so the
+        full-resolution raster is never held in memory. Like the Pillow
+        path, the result keeps the source's orientation, colour space and
+        PNG palette.
+        
+        Args:
+            image_path: Path to image file
+            target_width: Target width in pixels
+            
+        Returns:
+            True if handled, False if the image should be resized with Pillow
+        """
+        # Reading the header is enough to check the current width
+        source = pyvips.Image.new_from_file(str(image_path))
+        if source.width == target_width:
+            return True
+            
+        # thumbnail() always converts CMYK and other colour spaces to sRGB
+        if source.interpretation not in ('srgb', 'b-w', 'rgb16', 'grey16'):
+            return False
+            
+        resized = pyvips.Image.thumbnail(str(image_path), target_width,
+                                         height=_VIPS_MAX_HEIGHT, no_rotate=True)
+        
+        # Write palette PNGs (common for screenshots) with a palette again
+        # instead of as much larger 24-bit RGB
+        save_options = {}
+        if image_path.suffix.lower() == '.png' and source.get_typeof('palette'):
+            save_options['palette'] = True
+            if source.get_typeof('bits-per-sample'):
+                save_options['bitdepth'] = source.get('bits-per-sample')
+                
+        # The source is read lazily while writing, so write to a temporary
+        # file with the same extension and swap it in afterwards
+        tmp_path = image_path.with_name(f".{image_path.stem}.resize{image_path.suffix}")
+        try:
+            resized.write_to_file(str(tmp_path), **save_options)
+            os.replace(tmp_path, image_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+            
+        if self.verbose:
+            _log(f"Resized image {image_path.name} to {resized.width}x{resized.height}")
+        return True
+        
     def resize_image(self, image_path: Path, target_width: int) -> bool:
         """
         Resize image to target width while maintaining aspect ratio
         
+        Uses pyvips when it is installed and falls back to Pillow otherwise,
+        and for colour spaces libvips would convert.
+        
         Args:
             image_path: Path to image file
             target_width: Target width in pixels
@@ -259,29 +708,55 @@ class ImageDownloader:
         Returns:
             True if successful, False if failed
         """
+        if pyvips is not None:
+            try:
+                if self._resize_with_vips(image_path, target_width):
+                    return True
+            except pyvips.Error as e:
+                if self.verbose:
+                    _log(f"pyvips could not resize {image_path.name}, using Pillow: {e}")
+                    
         try:
             with Image.open(image_path) as img:
+                # Nothing to do if the image already has the target width
+                if img.width == target_width:
+                    return True
+                    
                 # Calculate new height maintaining aspect ratio
                 aspect_ratio = img.height / img.width
                 target_height = int(target_width * aspect_ratio)
                 
+                # Large reductions gain little from Lanczos, and for JPEG
+                # draft() below already did most of the work
+                if img.width > target_width * 4:
+                    resample = Image.Resampling.BILINEAR
+                else:
+                    resample = Image.Resampling.LANCZOS
+                    
+                # Let libjpeg scale down while decoding instead of decoding
+                # the full-resolution image
+                image_format = img.format
+                if image_format == 'JPEG':
+                    img.draft(img.mode, (target_width, target_height))
+                    
                 # Resize image
-                resized_img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
+                resized_img = img.resize((target_width, target_height), resample)
                 
-                # Save resized image
-                resized_img.save(image_path, optimize=True)
+                # Save resized image; optimize is only cheap for JPEG
+                # (for PNG it means another full zlib pass)
+                resized_img.save(image_path, optimize=(image_format == 'JPEG'))
                 
                 if self.verbose:
-                    print(f"Resized image {image_path.name} to {target_width}x{target_height}")
+                    _log(f"Resized image {image_path.name} to {target_width}x{target_height}")
                     
                 return True
                 
         except Exception as e:
-            print(f"Failed to resize image {image_path}: {e}")
+            _log(f"Failed to resize image {image_path}: {e}")
             return False
             
     def process_images(self, markdown_text: str, target_dir: Path, 
-                      images_subdir: bool = False) -> str:
+                      images_subdir: bool = False) -> Tuple[str, int]:
         """
         Process all images in markdown text
         
@@ -291,57 +766,64 @@ class ImageDownloader:
             images_subdir: If True, save images in 'images' subdirectory
             
         Returns:
-            Modified markdown text with updated image links
+            Tuple of the modified markdown text with updated image links and
+            the number of images that could not be downloaded
         """
         images = self.extract_images(markdown_text)
         if not images:
-            return markdown_text
+            return markdown_text, 0
             
         # Determine image directory
         if images_subdir:
             image_dir = target_dir / "images"
-            image_dir.mkdir(exist_ok=True)
+            with self._dirs_lock:
+                if image_dir not in self._created_dirs:
+                    image_dir.mkdir(exist_ok=True)
+                    self._created_dirs.add(image_dir)
             relative_prefix = "images/"
         else:
             image_dir = target_dir
             relative_prefix = ""
             
-        modified_text = markdown_text
+        # Download (and resize if width is specified) each distinct
+        # image and width once, in parallel
+        keys = list(dict.fromkeys(
+            (image_info['src'], self._resize_width(image_info['width']))
+            for image_info in images
+        ))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            filenames = list(executor.map(
+                self.download_image,
+                [url for url, _ in keys], repeat(image_dir), [width for _, width in keys]
+            ))
+        downloaded = {
+            key: filename for key, filename in zip(keys, filenames) if filename
+        }
+        failed = len(keys) - len(downloaded)
         
-        for image_info in images:
-            url = image_info['src']
-            width = image_info['width']
-            original_tag = image_info['original_tag']
-            
-            # Download image
-            filename = self.download_image(url, image_dir)
-            if not filename:
-                continue
-                
-            image_path = image_dir / filename
-            
-            # Resize if width is specified
-            if width and width.isdigit():
-                target_width = int(width)
-                self.resize_image(image_path, target_width)
+        def replace_tag(match: re.Match) -> str:
+            width_match = _WIDTH_RE.search(match.group(0))
+            width = width_match.group(1) if width_match else None
+            filename = downloaded.get((match.group(1), self._resize_width(width)))
+            # Keep the original tag if the download failed
+            if filename is None:
+                return match.group(0)
                 
             # Create new image tag with local path
-            relative_path = relative_prefix + filename
-            new_tag = f'<img src="{relative_path}"'
+            new_tag = f'<img src="{relative_prefix}{filename}"'
             if width:
                 new_tag += f' width="{width}"'
-            new_tag += '>'
+            return new_tag + '>'
             
-            # Replace original tag with new tag
-            modified_text = modified_text.replace(original_tag, new_tag)
-            
-        return modified_text
+        # Replace all tags in a single pass over the original text
+        return _IMG_RE.sub(replace_tag, markdown_text), failed
 
 
 class PostDownloader:
     """Handles downloading and saving posts to local filesystem"""
     
-    def __init__(self, output_dir: str, verbose: bool = False, images_subdir: bool = False):
+    def __init__(self, output_dir: str, verbose: bool = False, images_subdir: bool = False,
+                 http: Optional[urllib3.PoolManager] = None):
         """
         Initialize the downloader
         
@@ -349,12 +831,19 @@ class PostDownloader:
             output_dir: Output directory path
             verbose: Enable verbose logging
             images_subdir: If True, save images in 'images' subdirectories
+            http: Connection pool to share with the API client (optional)
         """
         self.output_dir = Path(output_dir)
         self.verbose = verbose
         self.images_subdir = images_subdir
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.image_downloader = ImageDownloader(verbose)
+        # Post directories known to exist, to skip repeated mkdir calls
+        self._created_dirs: Set[Path] = {self.output_dir}
+        self._dirs_lock = threading.Lock()
+        self.state = DownloadState(self.output_dir)
+        # Saved post files by post number, built lazily by _existing_posts()
+        self._existing: Optional[Dict[int, List[Path]]] = None
+        self.image_downloader = ImageDownloader(verbose, http, self.state)
         
     def sanitize_path(self, path: str) -> str:
         """
@@ -367,23 +856,7 @@ class PostDownloader:
             Sanitized path safe for filesystem
         """
         # Replace characters that are invalid in file systems
-        replacements = {
-            '/': '_',
-            '\\': '_',
-            ':': '-',
-            '*': '_',
-            '?': '_',
-            '"': "'",
-            '<': '(',
-            '>': ')',
-            '|': '_',
-            '\n': ' ',
-            '\r': ' ',
-            '\t': ' '
-        }
-        
-        for char, replacement in replacements.items():
-            path = path.replace(char, replacement)
+        path = path.translate(_SANITIZE_TABLE)
             
         # Remove leading/trailing spaces and dots
         path = path.strip(' .')
@@ -394,12 +867,44 @@ class PostDownloader:
             
         # Truncate if too long (considering UTF-8 encoding)
         max_bytes = 255
-        while len(path.encode('utf-8')) > max_bytes:
-            path = path[:-1]
+        encoded = path.encode('utf-8')
+        if len(encoded) > max_bytes:
+            # Cut at the byte limit and drop a trailing partial character
+            path = encoded[:max_bytes].decode('utf-8', 'ignore')
             
         return path
         
-    def save_post(self, post: Dict[str, Any]) -> str:
+    @staticmethod
+    def _write_file(filepath: Path, chunks: List[bytes]) -> None:
+        """
+        Write chunks to a file with unbuffered writes
+        
+        Uses a single writev() call where available and retries short writes.
+        
+        Args:
+            filepath: Path to write
+            chunks: Byte strings to write in order
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        views = [memoryview(chunk) for chunk in chunks if chunk]
+        
+        fd = os.open(filepath, flags, 0o644)
+        try:
+            while views:
+                if hasattr(os, 'writev'):
+                    written = os.writev(fd, views)
+                else:
+                    written = os.write(fd, views[0])
+                    
+                # Drop what has been written and retry the rest
+                while views and written >= len(views[0]):
+                    written -= len(views.pop(0))
+                if written:
+                    views[0] = views[0][written:]
+        finally:
+            os.close(fd)
+            
+    def save_post(self, post: Dict[str, Any]) -> Tuple[str, int]:
         """
         Save a post to the filesystem
         
@@ -407,7 +912,8 @@ class PostDownloader:
             post: Post data from API
             
         Returns:
-            Path to saved file
+            Tuple of the path to the saved file and the number of images
+            that could not be downloaded (their tags keep the remote URL)
         """
         # Extract post details
         number = post['number']
@@ -429,7 +935,10 @@ class PostDownloader:
         else:
             post_dir = self.output_dir
             
-        post_dir.mkdir(parents=True, exist_ok=True)
+        with self._dirs_lock:
+            if post_dir not in self._created_dirs:
+                post_dir.mkdir(parents=True, exist_ok=True)
+                self._created_dirs.add(post_dir)
         
         # Create filename
         sanitized_name = self.sanitize_path(name)
@@ -452,33 +961,168 @@ wip: {str(wip).lower()}
 """
         
         # Process images in body_md
-        processed_body = self.image_downloader.process_images(
+        processed_body, failed_images = self.image_downloader.process_images(
             body_md, post_dir, self.images_subdir
         )
         
-        # Write file
-        content = frontmatter + processed_body
+        # Write file; the parts are encoded separately and written together
+        # so the full content is never concatenated in memory
+        chunks = [frontmatter.encode('utf-8'), processed_body.encode('utf-8')]
         
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            self._write_file(filepath, chunks)
             if self.verbose:
-                print(f"Saved: {filepath}")
-            return str(filepath)
+                _log(f"Saved: {filepath}")
+            return str(filepath), failed_images
         except IOError as e:
-            print(f"Error saving file {filepath}: {e}")
+            _log(f"Error saving file {filepath}: {e}")
             raise
             
+    def _existing_posts(self) -> Dict[int, List[Path]]:
+        """
+        Index the post files already in the output directory by post number
+        
+        The directory tree is walked once with os.scandir, which reports file
+        types without a stat() per entry.
+        
+        Returns:
+            Mapping of post number to the saved files for that post
+        """
+        if self._existing is None:
+            existing: Dict[int, List[Path]] = {}
+            pending = [self.output_dir]
+            while pending:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(Path(entry.path))
+                            continue
+                        match = _POST_FILENAME_RE.match(entry.name)
+                        if match:
+                            existing.setdefault(int(match.group(1)), []).append(Path(entry.path))
+            self._existing = existing
+        return self._existing
+        
+    def _is_post_current(self, post: Dict[str, Any]) -> bool:
+        """
+        Check whether a post was saved before and has not changed since
+        
+        Uses the download state when it has the post, and otherwise compares
+        the saved file's modification time with the post's updated_at.
+        
+        Args:
+            post: Post from the search listing
+            
+        Returns:
+            True if the saved file is up to date
+        """
+        paths = self._existing_posts().get(post['number'])
+        if not paths:
+            return False
+            
+        entry = self.state.get_post(post['number'])
+        if entry is not None:
+            return (entry.get('complete', True)
+                    and entry['updated_at'] == post.get('updated_at')
+                    and self.output_dir / entry['path'] in paths)
+                    
+        try:
+            updated_at = datetime.fromisoformat(post['updated_at']).timestamp()
+        except (KeyError, ValueError):
+            return False
+        return any(path.stat().st_mtime >= updated_at for path in paths)
+        
+    def _get_full_post(self, client: EsaClient, post: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return a post with its body, fetching it only when the listing lacks it
+        
+        Args:
+            client: EsaClient instance
+            post: Post from the search listing
+            
+        Returns:
+            Post data including body_md
+        """
+        # The search listing already carries body_md, so no extra request
+        # is needed in the common case
+        if post.get('body_md') is not None:
+            return post
+            
+        # Get full post details
+        if self.verbose:
+            _log(f"Fetching post {post['number']}: {post['name']}")
+        return client.get_post(post['number'])
+        
+    def _download_post(self, client: EsaClient,
+                       post: Dict[str, Any]) -> Tuple[Dict[str, Any], str, int]:
+        """
+        Fetch a post's details if needed and save it, in a worker thread
+        
+        Args:
+            client: EsaClient instance
+            post: Post from the search listing
+            
+        Returns:
+            Tuple of the full post, the path to the saved file and the number
+            of images that could not be downloaded
+        """
+        full_post = self._get_full_post(client, post)
+        filepath, failed_images = self.save_post(full_post)
+        return full_post, filepath, failed_images
+        
+    def _download_batch(self, client: EsaClient, executor: ThreadPoolExecutor,
+                        posts: List[Dict[str, Any]]) -> List[str]:
+        """
+        Fetch missing post details and save the posts in parallel
+        
+        Args:
+            client: EsaClient instance
+            executor: Executor used to download posts concurrently
+            posts: Posts from the search listing
+            
+        Returns:
+            List of saved file paths
+        """
+        # Each task fetches and saves one post, including its images, so
+        # slow posts do not hold up the others
+        futures = {
+            executor.submit(self._download_post, client, post): post
+            for post in posts
+        }
+            
+        saved_files = []
+        for future in as_completed(futures):
+            post = futures[future]
+            try:
+                full_post, filepath, failed_images = future.result()
+            except Exception as e:
+                _log(f"Error processing post {post['number']}: {e}")
+                continue
+                
+            # Posts with missing images are downloaded again next run
+            if failed_images:
+                _log(f"Post {post['number']} has {failed_images} image(s) that could "
+                     f"not be downloaded; it will be retried on the next run")
+            self.state.set_post(full_post, filepath, complete=not failed_images)
+            saved_files.append(filepath)
+                
+        return saved_files
+        
     def download_all(self, client: EsaClient, query: Optional[str] = None,
-                    limit: Optional[int] = None, dry_run: bool = False) -> List[str]:
+                    limit: Optional[int] = None, dry_run: bool = False,
+                    force: bool = False) -> List[str]:
         """
         Download all posts matching the query
         
+        Posts that are unchanged since the previous run are skipped unless
+        force is set.
+        
         Args:
             client: EsaClient instance
             query: Search query
             limit: Maximum number of posts to download
             dry_run: If True, only list posts without downloading
+            force: If True, download posts even if they are unchanged
             
         Returns:
             List of saved file paths
@@ -486,63 +1130,73 @@ wip: {str(wip).lower()}
         saved_files = []
         page = 1
         total_downloaded = 0
+        skipped = 0
         
         print(f"Fetching posts{' with query: ' + query if query else ''}...")
         
-        while True:
-            # Fetch posts
-            response = client.search_posts(query=query, page=page)
-            posts = response.get('posts', [])
-            total_count = response.get('total_count', 0)
-            
-            if page == 1:
-                print(f"Found {total_count} posts")
-                if dry_run:
-                    print("\nDry run mode - listing posts without downloading:")
-                    print("-" * 60)
-            
-            if not posts:
-                break
-                
-            for post in posts:
-                if limit and total_downloaded >= limit:
-                    print(f"\nReached limit of {limit} posts")
-                    return saved_files
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                while True:
+                    # Fetch posts
+                    response = client.search_posts(query=query, page=page)
+                    posts = response.get('posts', [])
+                    total_count = response.get('total_count', 0)
                     
-                if dry_run:
-                    print(f"[{post['number']}] {post['name']}")
-                    if post.get('category'):
-                        print(f"    Category: {post['category']}")
-                    if post.get('tags'):
-                        print(f"    Tags: {', '.join(post['tags'])}")
-                else:
-                    # Get full post details
-                    if self.verbose:
-                        print(f"Fetching post {post['number']}: {post['name']}")
+                    if page == 1:
+                        print(f"Found {total_count} posts")
+                        if dry_run:
+                            print("\nDry run mode - listing posts without downloading:")
+                            print("-" * 60)
+                    
+                    if not posts:
+                        break
                         
-                    try:
-                        full_post = client.get_post(post['number'])
-                        filepath = self.save_post(full_post)
-                        saved_files.append(filepath)
-                    except Exception as e:
-                        print(f"Error processing post {post['number']}: {e}")
-                        continue
+                    batch = []
+                    reached_limit = False
+                    for post in posts:
+                        if limit and total_downloaded >= limit:
+                            reached_limit = True
+                            break
+                            
+                        if dry_run:
+                            print(f"[{post['number']}] {post['name']}")
+                            if post.get('category'):
+                                print(f"    Category: {post['category']}")
+                            if post.get('tags'):
+                                print(f"    Tags: {', '.join(post['tags'])}")
+                            total_downloaded += 1
+                        elif not force and self._is_post_current(post):
+                            # Skipped posts do not count towards the limit
+                            if self.verbose:
+                                print(f"Skipping unchanged post {post['number']}: {post['name']}")
+                            skipped += 1
+                        else:
+                            batch.append(post)
+                            total_downloaded += 1
                         
-                total_downloaded += 1
-                
-            # Check if there are more pages
-            next_page = response.get('next_page')
-            if not next_page:
-                break
-                
-            page += 1
+                    if batch:
+                        saved_files.extend(self._download_batch(client, executor, batch))
+                        # Record progress so an interrupted run can resume
+                        self.state.save()
+                        
+                    if reached_limit:
+                        print(f"\nReached limit of {limit} posts")
+                        return saved_files
+                        
+                    # Check if there are more pages
+                    next_page = response.get('next_page')
+                    if not next_page:
+                        break
+                        
+                    page += 1
+        finally:
+            # Remove the downloads kept for resizing to further widths
+            self.image_downloader.cleanup()
             
-            # Small delay to be nice to the API
-            if not dry_run:
-                time.sleep(0.5)
-                
         if not dry_run:
             print(f"\nDownloaded {len(saved_files)} posts to {self.output_dir}")
+            if skipped:
+                print(f"Skipped {skipped} unchanged posts")
             
         return saved_files
 
@@ -580,6 +1234,8 @@ Examples:
                        help='Maximum number of posts to download')
     parser.add_argument('--images-dir', action='store_true',
                        help='Save images in "images" subdirectory instead of alongside articles')
+    parser.add_argument('--force', action='store_true',
+                       help='Download all posts even if they are unchanged since the last run')
     parser.add_argument('-v', '--verbose', action='store_true',
                        help='Enable verbose output')
     
@@ -594,7 +1250,7 @@ Examples:
         
     # Create client and downloader
     client = EsaClient(access_token, args.team)
-    downloader = PostDownloader(args.output, args.verbose, args.images_dir)
+    downloader = PostDownloader(args.output, args.verbose, args.images_dir, client.http)
     
     try:
         # Download posts
@@ -602,7 +1258,8 @@ Examples:
             client,
             query=args.query,
             limit=args.limit,
-            dry_run=args.dry_run
+            dry_run=args.dry_run,
+            force=args.force
         )
     except KeyboardInterrupt:
         print("\nDownload interrupted by user")